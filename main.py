@@ -1,177 +1,473 @@
-from fastapi import FastAPI, Depends, File, UploadFile, HTTPException
-from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+from fastapi import APIRouter, FastAPI, Depends, File, UploadFile, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 import motor.motor_asyncio
-import os
-from dotenv import load_dotenv
+import hashlib
+import orjson
+from pathlib import Path
+from urllib.parse import quote
 from bson import ObjectId
-from mangum import Mangum
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from gridfs.errors import NoFile
 
-# Load environment variables (like MONGO_URI) from the .env file
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise RuntimeError("MONGO_URI not set in environment variables.")
+# Application settings using pydantic-settings.
+# Values are read once at import from environment variables (like MONGO_URI), falling back to the .env file
+# next to main.py, whatever the current working directory is.
+# A missing or invalid setting stops the app at startup instead of failing in the middle of a request.
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=Path(__file__).with_name(".env"), extra="ignore")
+    mongo_uri: str = Field(..., min_length=1)  # MongoDB connection string (MONGO_URI)
+    max_pool_size: int = 50  # MAX_POOL_SIZE
+    min_pool_size: int = 5  # MIN_POOL_SIZE
+    # VERCEL is set to "1" by Vercel's runtime. Vercel can freeze or recycle an instance right after
+    # it responds, so a background task cannot be trusted to write queued scores there.
+    vercel: bool = False
+    score_batching: bool | None = None  # SCORE_BATCHING, defaults to on everywhere except Vercel
+
+    @property
+    def batch_scores(self):
+        return not self.vercel if self.score_batching is None else self.score_batching
+
+settings = Settings()
+
+# MongoDB client options, built once at import time and used for the single client created in the lifespan.
+# Pool options:
+#   maxPoolSize=50 (MAX_POOL_SIZE) - Motor is async, so one process needs fewer sockets than sync PyMongo (default 100).
+#   minPoolSize=5 (MIN_POOL_SIZE)  - keeps a few warm connections open in a reused serverless container.
+#   maxConnecting=10    - lets a burst of uploads open connections in parallel (default is 2 at a time).
+#   maxIdleTimeMS=60000 - drops connections idle for more than a minute.
+#   waitQueueTimeoutMS / serverSelectionTimeoutMS - fail fast (5 s) instead of hanging a request.
+# Wire compression:
+#   compressors="zstd,zlib" - compresses traffic to Atlas (zstd preferred, zlib as fallback);
+#   trades a little CPU for fewer bytes on large sprite/audio uploads.
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": settings.max_pool_size,
+    "minPoolSize": settings.min_pool_size,
+    "maxConnecting": 10,
+    "maxIdleTimeMS": 60000,
+    "waitQueueTimeoutMS": 5000,
+    "serverSelectionTimeoutMS": 5000,
+    "compressors": "zstd,zlib",
+    "zlibCompressionLevel": 6,
+}
+
+# Errors are logged through uvicorn's logger, which uvicorn configures to print to the console.
+# Outside uvicorn, Python still prints warnings and errors to stderr.
+logger = logging.getLogger("uvicorn.error")
+
+# Score write batching:
+# POST /player_score puts the score on an in-process queue. A background task collects
+# up to SCORE_BATCH_SIZE scores (waiting at most SCORE_BATCH_WAIT seconds after the first one)
+# and writes them with a single insert_many, so a burst of scores costs one round trip to MongoDB.
+# A batch that fails to insert is retried with exponential backoff, so scores that were already
+# accepted are not dropped when Atlas is briefly unreachable.
+# When the queue cannot take a score (batching disabled, the background task has stopped, or the
+# queue stays full for SCORE_QUEUE_TIMEOUT seconds), POST /player_score inserts the score directly.
+SCORE_BATCH_SIZE = 200
+SCORE_BATCH_WAIT = 0.02  # seconds
+SCORE_QUEUE_SIZE = 10_000  # maximum number of pending scores
+SCORE_QUEUE_TIMEOUT = 1  # seconds to wait for room on a full queue before inserting directly
+SCORE_RETRY_DELAY = 0.5  # seconds before the first retry of a failed batch
+SCORE_RETRY_MAX_DELAY = 30  # seconds, upper bound for the retry backoff
+SCORE_SHUTDOWN_TIMEOUT = 10  # seconds to wait for pending scores to be written at shutdown
+
+async def insert_score_batch(collection, docs):
+    delay = SCORE_RETRY_DELAY
+    while True:
+        try:
+            await collection.insert_many(docs, ordered=False)
+            return
+        except BulkWriteError as exc:
+            # Scores written by an earlier attempt fail with duplicate key errors (code 11000) because
+            # their _id is already stored; anything else is a permanent error for that score.
+            errors = exc.details["writeErrors"]
+            for error in errors:
+                if error["code"] != 11000:
+                    logger.error("Dropping score %s: %s", docs[error["index"]]["_id"], error["errmsg"])
+            return
+        except PyMongoError:
+            logger.exception("Failed to insert a batch of %d scores, retrying in %s s", len(docs), delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, SCORE_RETRY_MAX_DELAY)
+
+# in_flight holds the batch currently being written, so shutdown can report it if it never completes.
+async def flush_scores(queue: asyncio.Queue, collection, in_flight: list):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()] # Wait for the first score of the next batch
+        deadline = loop.time() + SCORE_BATCH_WAIT
+        while len(batch) < SCORE_BATCH_SIZE and batch[-1] is not None:
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+        stop = batch[-1] is None # None is put on the queue at shutdown, after the last score
+        docs = [doc for doc in batch if doc is not None]
+        if docs:
+            in_flight[:] = docs
+            try:
+                await insert_score_batch(collection, docs)
+            except Exception: # Keep the task alive whatever happens to one batch
+                logger.exception("Unexpected error while inserting a batch of %d scores", len(docs))
+            in_flight.clear()
+        if stop:
+            return
+
+# Stops the score flusher at shutdown. Queuing the None marker and writing the pending scores share one
+# SCORE_SHUTDOWN_TIMEOUT deadline; after that the flusher is cancelled and the unwritten scores are logged.
+async def stop_score_flusher(queue: asyncio.Queue, flusher: asyncio.Task, in_flight: list):
+    async def drain():
+        await queue.put(None) # Let the flusher write any pending scores, then stop
+        await flusher
+    try:
+        await asyncio.wait_for(drain(), SCORE_SHUTDOWN_TIMEOUT)
+        return
+    except asyncio.TimeoutError:
+        flusher.cancel()
+    try:
+        await flusher
+    except asyncio.CancelledError:
+        pass
+    unwritten = len(in_flight) # The batch being retried when the flusher was cancelled
+    while not queue.empty():
+        if queue.get_nowait() is not None:
+            unwritten += 1
+    logger.error("Stopped with %d scores not yet written", unwritten)
+
+# Application lifespan:
+# Creates a single asynchronous MongoDB client when the app starts and closes it on shutdown.
+# The client keeps its own connection pool, so every request reuses already-open connections
+# instead of paying the TCP + TLS + authentication handshake again.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.mongo = motor.motor_asyncio.AsyncIOMotorClient(settings.mongo_uri, **MONGO_CLIENT_OPTIONS)
+    # Indexes are created here at startup, not lazily on the first request.
+    # Unique SHA-1 indexes are used to deduplicate identical uploads; the partial filter skips
+    # older documents that were stored before content hashes existed.
+    # Filename and player name/score indexes keep lookups on those fields from scanning the collection.
+    db = app.state.mongo["multimedia_db"]
+    for collection in (db.sprites, db.audio):
+        await collection.create_index(
+            "sha1", unique=True, partialFilterExpression={"sha1": {"$exists": True}}
+        )
+        await collection.create_index("filename")
+    await db.scores.create_index([("player_name", 1), ("score", -1)])
+    # Collection, queue and background task used for score inserts.
+    # Scores tolerate relaxed durability, so they are acknowledged by the primary without
+    # waiting for the journal (w=1, j=False). Sprites and audio keep the default write concern.
+    app.state.scores = db.get_collection("scores", write_concern=WriteConcern(w=1, j=False))
+    app.state.score_queue = asyncio.Queue(maxsize=SCORE_QUEUE_SIZE)
+    app.state.score_flusher = None
+    in_flight = []
+    if settings.batch_scores:
+        app.state.score_flusher = asyncio.create_task(flush_scores(app.state.score_queue, app.state.scores, in_flight))
+    yield
+    flusher = app.state.score_flusher
+    if flusher and not flusher.done():
+        await stop_score_flusher(app.state.score_queue, flusher, in_flight)
+    app.state.mongo.close()
 
 # MongoDB Dependency Injection using FastAPI's Depends:
-# Creates a new asynchronous MongoDB client for each request and ensures it is closed afterward.
-async def get_db():
-    client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+# Returns the "multimedia_db" database from the shared client created in the lifespan.
+def get_db(request: Request):
+    return request.app.state.mongo["multimedia_db"]
+
+# ObjectId path parameter dependency:
+# Parses the {id} path parameter once, before any database work. Malformed IDs are rejected
+# with a 422 error instead of causing a 500 error inside the handler.
+def get_object_id(id: str):
+    try:
+        return ObjectId(id)
+    except InvalidId:
+        raise HTTPException(status_code=422, detail="Invalid ID")
+
+# Returns the queue that the background task reads pending scores from,
+# or None when scores must be inserted directly (batching is disabled or the task has stopped).
+def get_score_queue(request: Request):
+    flusher = request.app.state.score_flusher
+    if flusher is None or flusher.done():
+        return None
+    return request.app.state.score_queue
+
+# Returns the "scores" collection with the relaxed write concern used for score inserts.
+def get_score_collection(request: Request):
+    return request.app.state.scores
+
+# Chunked upload reading:
+# Yields an uploaded file in fixed 1 MiB chunks. UploadFile.read() runs disk reads in a worker thread,
+# so other requests keep being served while a large upload is read, and memory stays bounded to one chunk.
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+async def iter_chunks(file: UploadFile, size: int = UPLOAD_CHUNK_SIZE):
+    while chunk := await file.read(size):
+        yield chunk
+
+# Content hashing:
+# Computes the SHA-1 hex digest of an uploaded file chunk by chunk,
+# then rewinds the file so it can be streamed into GridFS afterwards.
+async def hash_upload(file: UploadFile):
+    digest = hashlib.sha1()
+    async for chunk in iter_chunks(file):
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+# GridFS upload:
+# Writes an uploaded file into a GridFS bucket chunk by chunk and returns the new GridFS file ID.
+# A partially written file is aborted (its chunks are removed) if anything fails.
+async def store_upload(bucket, file: UploadFile):
+    grid_in = bucket.open_upload_stream(file.filename)
     try:
-        yield client["multimedia_db"]
-    finally:
-        client.close()
+        async for chunk in iter_chunks(file):
+            await grid_in.write(chunk)
+        await grid_in.close() # Writes the last chunk and the files document
+    except BaseException:
+        await grid_in.abort()
+        raise
+    return grid_in._id
+
+# Pre-serialized message responses:
+# The {"message": ...} part of the success responses is constant, so it is serialized once when the
+# endpoints are defined. Responses that also carry an ID only splice the serialized ID into the template.
+ID_PLACEHOLDER = b'"__ID__"'
+
+def message_body(message: str):
+    return orjson.dumps({"message": message})
+
+def id_message_template(message: str):
+    return orjson.dumps({"message": message, "id": "__ID__"})
+
+def json_response(body: bytes, status_code: int = 200):
+    return Response(content=body, media_type="application/json", status_code=status_code)
+
+def id_message_response(template: bytes, id: ObjectId, status_code: int = 200):
+    return json_response(template.replace(ID_PLACEHOLDER, orjson.dumps(str(id))), status_code)
 
 # Initialize the FastAPI app
-app = FastAPI()
+# ORJSONResponse serializes every response with orjson, which is much faster than the standard json module.
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Data model for player score using Pydantic.
 # This model is used to validate incoming data for player scores.
+# Surrounding whitespace is stripped from the player's name, and validated scores are immutable.
 class PlayerScore(BaseModel):
+    model_config = ConfigDict(frozen=True, str_strip_whitespace=True)
     player_name: str = Field(..., min_length=1, max_length=50)  # Player's name (1–50 characters)
-    score: int = Field(..., ge=0, le=999999)  # Score must be between 0 and 999999
+    score: int = Field(..., ge=0, le=999_999)  # Score must be between 0 and 999999
 
-# Endpoint: /upload_sprite
-# Method: POST
-# Description:
-#   Accepts an image (sprite) file upload.
-#   Stores the file in the MongoDB "sprites" collection with its filename and binary content.
-@app.post("/upload_sprite")
-async def upload_sprite(file: UploadFile = File(...), db=Depends(get_db)):
-    content = await file.read() # Read the file content
-    sprite_doc = {"filename": file.filename, "content": content} # Create a document with filename and content
-    result = await db.sprites.insert_one(sprite_doc) # Insert the document into the MongoDB collection
-    return {"message": "Sprite uploaded", "id": str(result.inserted_id)} # Return the ID of the inserted document as a response
-
-# Endpoint: /sprites/{id}
-# Method: GET
-# Description:
-#   Fetches a sprite document by ID.
-@app.get("/sprites/{id}") 
-async def get_sprite(id: str, db=Depends(get_db)):
-    sprite = await db.sprites.find_one({"_id": ObjectId(id)}) # Fetch the sprite document from the database using its ID
-    if not sprite: # If the sprite is not found, raise a 404 error
-        raise HTTPException(status_code=404, detail="Sprite not found") 
-    return {"filename": sprite["filename"]} # Return the filename of the sprite if found
-
-# Endpoint: /sprites/{id}
-# Method: PUT
-# Description:
-#   Updates the sprite's file.
-@app.put("/sprites/{id}")
-async def update_sprite(id: str, file: UploadFile = File(...), db=Depends(get_db)):
-    content = await file.read() # Read the new file content
-    result = await db.sprites.update_one( # Update the existing sprite document in the database
-        {"_id": ObjectId(id)},
-        {"$set": {"filename": file.filename, "content": content}}
-    )
-    if result.matched_count == 0: # If no document was matched, raise a 404 error
-        raise HTTPException(status_code=404, detail="Sprite not found")
-    return {"message": "Sprite updated"} # Return a success message
+# Binary asset (sprite / audio) router factory:
+# Builds the upload, GET, download, PUT and DELETE endpoints for one kind of binary asset, so sprites and audio
+# share a single implementation. Each asset's content is streamed into a GridFS bucket named after the
+# collection (stored in 255 KB chunks, so files are not limited to 16 MB), and the collection itself only
+# holds small reference documents with the filename, GridFS file ID, SHA-1, size and content type.
+#
+#   collection     - MongoDB collection and GridFS bucket name (e.g. "sprites")
+#   upload_path    - path of the upload endpoint (e.g. "/upload_sprite")
+#   label          - name used in response messages (e.g. "Sprite")
+#   upload_message - message returned after a successful upload
+def make_blob_router(collection: str, upload_path: str, label: str, upload_message: str):
+    router = APIRouter()
+    not_found = f"{label} not found"
+    name = label.lower() # Route names like "get_sprite" keep the Swagger summaries and operation IDs of the original handlers
+    uploaded = id_message_template(upload_message)
+    updated = message_body(f"{label} updated")
+    deleted = message_body(f"{label} deleted")
 
-# Endpoint: /sprites/{id}
-# Method: DELETE
-# Description:
-#   Deletes a sprite document by ID.
-@app.delete("/sprites/{id}")
-async def delete_sprite(id: str, db=Depends(get_db)): 
-    result = await db.sprites.delete_one({"_id": ObjectId(id)}) # Delete the sprite document from the database using its ID
-    if result.deleted_count == 0: # If no document was deleted, raise a 404 error
-        raise HTTPException(status_code=404, detail="Sprite not found")
-    return {"message": "Sprite deleted"} # Return a success message
-
-# Endpoint: /upload_audio
-# Method: POST
-# Description:
-#   Accepts an audio file upload.
-#   Stores the file in the MongoDB "audio" collection with its filename and binary content.
-@app.post("/upload_audio")
-async def upload_audio(file: UploadFile = File(...), db=Depends(get_db)):
-    content = await file.read()
-    audio_doc = {"filename": file.filename, "content": content}
-    result = await db.audio.insert_one(audio_doc)
-    return {"message": "Audio file uploaded", "id": str(result.inserted_id)}
-
-# Endpoint: /audio/{id}
-# Method: GET
-# Description:
-#   Fetches an audio document by ID.
-@app.get("/audio/{id}")
-async def get_audio(id: str, db=Depends(get_db)):
-    audio = await db.audio.find_one({"_id": ObjectId(id)})
-    if not audio:
-        raise HTTPException(status_code=404, detail="Audio not found")
-    return {"filename": audio["filename"]}
-
-# Endpoint: /audio/{id}
-# Method: PUT
-# Description:
-#   Updates an audio file.
-@app.put("/audio/{id}")
-async def update_audio(id: str, file: UploadFile = File(...), db=Depends(get_db)):
-    content = await file.read()
-    result = await db.audio.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": {"filename": file.filename, "content": content}}
-    )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Audio not found")
-    return {"message": "Audio updated"}
+    # Endpoint: <upload_path>
+    # Method: POST
+    # Description:
+    #   Accepts a file upload and streams it into GridFS.
+    #   Uploads are deduplicated by SHA-1: uploading identical content again returns the ID of the existing document.
+    @router.post(upload_path, name=f"upload_{name}")
+    async def upload(file: UploadFile = File(...), db=Depends(get_db)):
+        sha1 = await hash_upload(file) # Hash the file content to detect duplicates
+        existing = await db[collection].find_one({"sha1": sha1}, projection={"_id": 1}) # Look for a document with the same content
+        if existing: # If identical content is already stored, skip the upload entirely
+            return id_message_response(uploaded, existing["_id"])
+        bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name=collection) # Open the GridFS bucket for this asset type
+        file_id = await store_upload(bucket, file) # Stream the file content into GridFS chunk by chunk
+        doc = { # Create a small reference document: the content itself lives only in GridFS
+            "filename": file.filename,
+            "file_id": file_id,
+            "sha1": sha1,
+            "size": file.size,
+            "content_type": file.content_type,
+        }
+        try:
+            result = await db[collection].insert_one(doc) # Insert the document into the MongoDB collection
+        except DuplicateKeyError: # Another request stored the same content in the meantime
+            await bucket.delete(file_id) # Remove the content we just uploaded and reuse the existing document
+            existing = await db[collection].find_one({"sha1": sha1}, projection={"_id": 1})
+            if not existing: # The other document was deleted in between, so ask the client to retry
+                raise HTTPException(status_code=409, detail=f"{label} with identical content was changed concurrently, please retry")
+            return id_message_response(uploaded, existing["_id"])
+        return id_message_response(uploaded, result.inserted_id) # Return the ID of the inserted document as a response
 
-# Endpoint: /audio/{id}
-# Method: DELETE
-# Description:
-#   Deletes an audio document by ID.
-@app.delete("/audio/{id}")
-async def delete_audio(id: str, db=Depends(get_db)):
-    result = await db.audio.delete_one({"_id": ObjectId(id)})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Audio not found")
-    return {"message": "Audio deleted"}
+    # Endpoint: /<collection>/{id}
+    # Method: GET
+    # Description:
+    #   Fetches a document's filename by ID.
+    @router.get(f"/{collection}/{{id}}", name=f"get_{name}")
+    async def get(oid: ObjectId = Depends(get_object_id), db=Depends(get_db)):
+        doc = await db[collection].find_one({"_id": oid}, projection={"filename": 1, "_id": 0}) # Fetch only the filename using its ID
+        if not doc: # If the document is not found, raise a 404 error
+            raise HTTPException(status_code=404, detail=not_found)
+        return {"filename": doc["filename"]} # Return the filename if found
+
+    # Endpoint: /<collection>/{id}/download
+    # Method: GET
+    # Description:
+    #   Downloads the file content by ID.
+    #   The content is sent with a StreamingResponse fed from the GridFS download stream, so only one
+    #   chunk is held in memory at a time and the first bytes go out as soon as the first chunk arrives.
+    @router.get(f"/{collection}/{{id}}/download", name=f"download_{name}")
+    async def download(oid: ObjectId = Depends(get_object_id), db=Depends(get_db)):
+        doc = await db[collection].find_one( # Fetch the reference fields (and inline content of documents stored before GridFS)
+            {"_id": oid}, projection={"filename": 1, "file_id": 1, "content_type": 1, "content": 1}
+        )
+        if not doc: # If the document is not found, raise a 404 error
+            raise HTTPException(status_code=404, detail=not_found)
+        media_type = doc.get("content_type") or "application/octet-stream"
+        headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(doc['filename'] or '')}"}
+        if "file_id" not in doc: # Documents stored before GridFS keep their content inline
+            return Response(content=doc["content"], media_type=media_type, headers=headers)
+        bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name=collection)
+        try:
+            stream = await bucket.open_download_stream(doc["file_id"]) # Open the GridFS file for reading
+        except NoFile: # If the GridFS content is missing, raise a 404 error
+            raise HTTPException(status_code=404, detail=not_found)
+        headers["Content-Length"] = str(stream.length)
+
+        async def chunks():
+            try:
+                while chunk := await stream.readchunk(): # Yield the content one GridFS chunk at a time
+                    yield chunk
+            finally:
+                stream.close()
+
+        return StreamingResponse(chunks(), media_type=media_type, headers=headers)
+
+    # Endpoint: /<collection>/{id}
+    # Method: PUT
+    # Description:
+    #   Updates the file.
+    #   The new content is streamed into GridFS, then a single find_one_and_update both checks that the document exists
+    #   and points it at the new content. The old GridFS file is removed afterwards.
+    #   Returns 409 if another document already has identical content.
+    @router.put(f"/{collection}/{{id}}", name=f"update_{name}")
+    async def update(oid: ObjectId = Depends(get_object_id), file: UploadFile = File(...), db=Depends(get_db)):
+        sha1 = await hash_upload(file) # Hash the new file content
+        bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name=collection)
+        file_id = await store_upload(bucket, file) # Stream the new file content into GridFS
+        try:
+            doc = await db[collection].find_one_and_update( # Point the document at the new content, returning the old file ID
+                {"_id": oid},
+                {"$set": {"filename": file.filename, "file_id": file_id, "sha1": sha1, "size": file.size, "content_type": file.content_type}},
+                projection={"file_id": 1},
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError: # If another document already has this content, keep the old content and raise a 409 error
+            await bucket.delete(file_id)
+            raise HTTPException(status_code=409, detail=f"{label} with identical content already exists")
+        if not doc: # If the document is not found, remove the new content and raise a 404 error
+            await bucket.delete(file_id)
+            raise HTTPException(status_code=404, detail=not_found)
+        if "file_id" in doc: # Documents stored before GridFS kept their content inline and have no GridFS file
+            await bucket.delete(doc["file_id"]) # Remove the old content from GridFS
+        return json_response(updated) # Return a success message
+
+    # Endpoint: /<collection>/{id}
+    # Method: DELETE
+    # Description:
+    #   Deletes a document by ID, together with its content in GridFS.
+    @router.delete(f"/{collection}/{{id}}", name=f"delete_{name}")
+    async def delete(oid: ObjectId = Depends(get_object_id), db=Depends(get_db)):
+        doc = await db[collection].find_one_and_delete({"_id": oid}, projection={"file_id": 1}) # Delete the document from the database using its ID
+        if not doc: # If no document was deleted, raise a 404 error
+            raise HTTPException(status_code=404, detail=not_found)
+        if "file_id" in doc:
+            bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name=collection)
+            await bucket.delete(doc["file_id"]) # Delete the content from GridFS
+        return json_response(deleted) # Return a success message
+
+    return router
+
+# Endpoints: /upload_sprite, /sprites/{id}
+# Image (sprite) uploads, stored in the "sprites" collection and GridFS bucket.
+app.include_router(make_blob_router("sprites", "/upload_sprite", "Sprite", "Sprite uploaded"))
+
+# Endpoints: /upload_audio, /audio/{id}
+# Audio file uploads, stored in the "audio" collection and GridFS bucket.
+app.include_router(make_blob_router("audio", "/upload_audio", "Audio", "Audio file uploaded"))
+
+SCORE_ACCEPTED = id_message_template("Score accepted")
+SCORE_RECORDED = id_message_template("Score recorded")
+SCORE_UPDATED = message_body("Score updated")
+SCORE_DELETED = message_body("Score deleted")
 
 # Endpoint: /player_score
 # Method: POST
 # Description:
 #   Accepts a JSON payload with a player's name and score.
 #   Uses Pydantic for validation and sanitization to prevent NoSQL injection attacks.
-#   Stores the data in the MongoDB "scores" collection.
-@app.post("/player_score")
-async def add_score(score: PlayerScore, db=Depends(get_db)):
-    score_doc = score.dict()
-    result = await db.scores.insert_one(score_doc)
-    return {"message": "Score recorded", "id": str(result.inserted_id)}
+#   Queues the data for a batched insert into the MongoDB "scores" collection and returns 202 Accepted.
+#   The ID is generated here, so it can be returned before the score is written.
+#   If the score cannot be queued, it is inserted directly and 201 Created is returned instead.
+#   The score endpoints return Response objects directly, so FastAPI does not run the plain
+#   dict responses through jsonable_encoder and response model processing.
+@app.post("/player_score", status_code=202, response_model=None)
+async def add_score(score: PlayerScore, queue=Depends(get_score_queue), scores=Depends(get_score_collection)):
+    score_doc = score.model_dump()
+    score_doc["_id"] = ObjectId()
+    if queue is not None:
+        try:
+            await asyncio.wait_for(queue.put(score_doc), SCORE_QUEUE_TIMEOUT)
+            return id_message_response(SCORE_ACCEPTED, score_doc["_id"], status_code=202)
+        except asyncio.TimeoutError: # The queue stayed full, so write this score directly
+            pass
+    await scores.insert_one(score_doc)
+    return id_message_response(SCORE_RECORDED, score_doc["_id"], status_code=201)
 
 # Endpoint: /player_score/{id}
 # Method: GET
 # Description:
 #   Fetches a player score document by ID.
-@app.get("/player_score/{id}")
-async def get_score(id: str, db=Depends(get_db)):
-    score = await db.scores.find_one({"_id": ObjectId(id)})
+@app.get("/player_score/{id}", response_model=None)
+async def get_score(oid: ObjectId = Depends(get_object_id), db=Depends(get_db)):
+    score = await db.scores.find_one({"_id": oid}, projection={"player_name": 1, "score": 1, "_id": 0})
     if not score:
         raise HTTPException(status_code=404, detail="Score not found")
-    return {"player_name": score["player_name"], "score": score["score"]}
+    return ORJSONResponse(score) # The projection already limits the document to player_name and score
 
 # Endpoint: /player_score/{id}
 # Method: PUT
 # Description:
 #   Updates a player score document.
-@app.put("/player_score/{id}")
-async def update_score(id: str, score: PlayerScore, db=Depends(get_db)):
-    result = await db.scores.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": score.dict()}
+@app.put("/player_score/{id}", response_model=None)
+async def update_score(score: PlayerScore, oid: ObjectId = Depends(get_object_id), db=Depends(get_db)):
+    result = await db.scores.find_one_and_update(
+        {"_id": oid},
+        {"$set": score.model_dump()},
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    if result.matched_count == 0:
+    if not result:
         raise HTTPException(status_code=404, detail="Score not found")
-    return {"message": "Score updated"}
+    return json_response(SCORE_UPDATED)
 
 # Endpoint: /player_score/{id}
 # Method: DELETE
 # Description:
 #   Deletes a player score document by ID.
-@app.delete("/player_score/{id}")
-async def delete_score(id: str, db=Depends(get_db)):
-    result = await db.scores.delete_one({"_id": ObjectId(id)})
+@app.delete("/player_score/{id}", response_model=None)
+async def delete_score(oid: ObjectId = Depends(get_object_id), db=Depends(get_db)):
+    result = await db.scores.delete_one({"_id": oid})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Score not found")
-    return {"message": "Score deleted"}
+    return json_response(SCORE_DELETED)